@@ -2,159 +2,270 @@
 # -*- coding: utf-8 -*-
 """
 API 路由定义
-提供4个报表生成接口
+提供4个报表生成接口，以及对应的后台任务接口
 """
 
+import asyncio
 import os
-from typing import List, Optional
+from datetime import date
+from functools import partial
+from typing import BinaryIO, List, Optional, Tuple, Union
+from urllib.parse import quote
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-from app.core.queue import get_task_queue
-from app.services.report import (
-    generate_daily_report,
-    generate_weekly_report,
-    generate_monthly_report,
-    generate_custom_report
-)
+from app.core.metrics import REPORT_CACHE_HITS, REPORT_CACHE_MISSES
+from app.core.queue import get_task_queue, read_task_status, QueueFullError, TASK_PENDING, TASK_FAILED
+from app.core.report_cache import is_closed_period, report_cache_key, get_cached_report, store_report
+from app.services.report import fetch_daily_data, fetch_weekly_data
+from app.services.report_writer import write_daily_xlsx, write_weekly_xlsx
 
 router = APIRouter(prefix="/api/report", tags=["报表生成"])
 
+# 队列已满时建议客户端的重试间隔（秒）
+RETRY_AFTER_SECONDS = 10
+
+
+# 报表文件的 MIME 类型
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# 分块发送的块大小，减少大文件的读写次数
+CHUNK_SIZE = 1024 * 1024
+
+
+class ReportFileResponse(FileResponse):
+    """
+    报表文件响应，按 1MB 分块读取发送
+    从构造前已打开的文件读取（见 _open_report_file）：返回响应后文件被临时目录清理删除也不影响发送
+    """
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, file: BinaryIO, **kwargs):
+        super().__init__(**kwargs)
+        self.file = file
+
+    async def __call__(self, scope, receive, send):
+        with self.file:
+            await send({
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            })
+            more_body = True
+            while more_body:
+                chunk = await asyncio.to_thread(self.file.read, self.chunk_size)
+                more_body = len(chunk) == self.chunk_size
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        if self.background is not None:
+            await self.background()
 
 # ==================== 请求模型 ====================
 class DailyReportRequest(BaseModel):
     """日报请求参数"""
-    report_date: str = Field(..., description="报表日期，格式: YYYY-MM-DD", example="2025-12-18")
+    report_date: date = Field(..., description="报表日期，格式: YYYY-MM-DD", example="2025-12-18")
     accounts: Optional[List[str]] = Field(None, description="门店账号列表", example=["13718175572a", "19318574226a"])
 
 
 class WeeklyReportRequest(BaseModel):
     """周报请求参数"""
-    week1_start: str = Field(..., description="第一周开始日期", example="2025-12-01")
-    week1_end: str = Field(..., description="第一周结束日期", example="2025-12-07")
-    week2_start: str = Field(..., description="第二周开始日期", example="2025-12-08")
-    week2_end: str = Field(..., description="第二周结束日期", example="2025-12-14")
+    week1_start: date = Field(..., description="第一周开始日期", example="2025-12-01")
+    week1_end: date = Field(..., description="第一周结束日期", example="2025-12-07")
+    week2_start: date = Field(..., description="第二周开始日期", example="2025-12-08")
+    week2_end: date = Field(..., description="第二周结束日期", example="2025-12-14")
     accounts: Optional[List[str]] = Field(None, description="门店账号列表")
 
 
 class MonthlyReportRequest(BaseModel):
     """月报请求参数"""
-    month1_start: str = Field(..., description="第一个月开始日期", example="2025-11-01")
-    month1_end: str = Field(..., description="第一个月结束日期", example="2025-11-30")
-    month2_start: str = Field(..., description="第二个月开始日期", example="2025-12-01")
-    month2_end: str = Field(..., description="第二个月结束日期", example="2025-12-31")
+    month1_start: date = Field(..., description="第一个月开始日期", example="2025-11-01")
+    month1_end: date = Field(..., description="第一个月结束日期", example="2025-11-30")
+    month2_start: date = Field(..., description="第二个月开始日期", example="2025-12-01")
+    month2_end: date = Field(..., description="第二个月结束日期", example="2025-12-31")
     accounts: Optional[List[str]] = Field(None, description="门店账号列表")
 
 
 class CustomReportRequest(BaseModel):
     """自定义报表请求参数"""
-    period1_start: str = Field(..., description="第一个时期开始日期", example="2025-12-01")
-    period1_end: str = Field(..., description="第一个时期结束日期", example="2025-12-07")
-    period2_start: str = Field(..., description="第二个时期开始日期", example="2025-12-08")
-    period2_end: str = Field(..., description="第二个时期结束日期", example="2025-12-14")
+    period1_start: date = Field(..., description="第一个时期开始日期", example="2025-12-01")
+    period1_end: date = Field(..., description="第一个时期结束日期", example="2025-12-07")
+    period2_start: date = Field(..., description="第二个时期开始日期", example="2025-12-08")
+    period2_end: date = Field(..., description="第二个时期结束日期", example="2025-12-14")
     accounts: Optional[List[str]] = Field(None, description="门店账号列表")
     shop_id: Optional[str] = Field(None, description="门店ID，用于筛选账号下的单个门店")
 
 
-# ==================== API 路由 ====================
-@router.post("/daily", summary="生成日报", description="生成指定日期的门店日报")
-async def create_daily_report(request: DailyReportRequest):
+# ==================== 报表执行 ====================
+def _open_file(file_path: str) -> Tuple[BinaryIO, os.stat_result]:
+    """打开文件并获取其状态"""
+    file = open(file_path, "rb")
+    return file, os.fstat(file.fileno())
+
+
+async def _open_report_file(file_path: Optional[str]) -> Optional[ReportFileResponse]:
     """
-    生成日报
-    - 传入日期和可选的账号列表
-    - 返回 Excel 文件下载
+    在线程中打开报表文件并构造下载响应，不阻塞事件循环；文件不存在（已被清理）时返回 None
+    先打开再返回响应，之后临时目录清理删除该文件不影响本次下载
     """
+    if not file_path:
+        return None
     try:
-        queue = get_task_queue()
-        file_path = await queue.run_task(
-            generate_daily_report,
-            request.report_date,
-            request.accounts
-        )
-
-        if not file_path or not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="报表生成失败，未找到文件")
+        file, stat_result = await asyncio.to_thread(_open_file, file_path)
+    except FileNotFoundError:
+        return None
+
+    return ReportFileResponse(
+        file,
+        path=file_path,
+        filename=os.path.basename(file_path),
+        media_type=XLSX_MEDIA_TYPE,
+        stat_result=stat_result
+    )
+
+
+def _content_disposition(filename: str) -> str:
+    """构造下载文件名响应头，中文文件名按 RFC 5987 编码（与 FileResponse 一致）"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _iter_chunks(content: bytes):
+    """按块切分报表内容"""
+    for offset in range(0, len(content), CHUNK_SIZE):
+        yield content[offset:offset + CHUNK_SIZE]
 
-        filename = os.path.basename(file_path)
-        return FileResponse(
-            path=file_path,
-            filename=filename,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+
+async def _report_response(result: Union[str, Tuple[str, bytes]]):
+    """
+    构造报表下载响应
+    - 文件路径: 从缓存目录发送文件，文件已被清理时返回 None
+    - (文件名, 内容): 内存中生成的报表，不落盘，直接分块发送
+    """
+    if isinstance(result, str):
+        return await _open_report_file(result)
+
+    filename, content = result
+    return StreamingResponse(
+        _iter_chunks(content),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": _content_disposition(filename),
+            "Content-Length": str(len(content))
+        }
+    )
+
+
+async def _generate_and_store(cache_key: str, fetch, write, *args) -> str:
+    """生成报表并移入缓存目录"""
+    file_path = await get_task_queue().run_report(fetch, write, *args)
+    return await asyncio.to_thread(store_report, cache_key, file_path)
+
+
+async def _run_report(report_type: str, request: BaseModel, end_dates: Tuple[date, ...], fetch, write, *args,
+                      for_task: bool = False) -> Union[str, Tuple[str, bytes]]:
+    """
+    排队生成报表
+    - fetch 在线程池中查询数据，write 在进程池中写入 Excel
+    - 参数相同的并发请求合并为一次生成
+    - 已结束周期的报表命中缓存时直接返回文件路径，不再排队生成
+    - 未结束周期的报表不缓存：同步接口在内存中生成，返回 (文件名, 内容)，不写临时文件；
+      for_task 为后台任务调用，结果需保留到下载，仍写入文件并返回路径
+    """
+    queue = get_task_queue()
+    cache_key = report_cache_key(report_type, request.model_dump())
+    if not is_closed_period(*end_dates):
+        if for_task:
+            return await queue.run_task_dedup(f"task_{cache_key}", queue.run_report, fetch, write, *args)
+        return await queue.run_task_dedup(cache_key, queue.run_report, fetch, partial(write, in_memory=True), *args)
+
+    file_path = await asyncio.to_thread(get_cached_report, cache_key)
+    if file_path:
+        REPORT_CACHE_HITS.labels(report_type).inc()
+        return file_path
+
+    REPORT_CACHE_MISSES.labels(report_type).inc()
+    return await queue.run_task_dedup(cache_key, _generate_and_store, cache_key, fetch, write, *args)
+
+
+async def _serve_report(report_type: str, request: BaseModel, end_dates: Tuple[date, ...], fetch, write, *args):
+    """
+    同步报表接口的公共流程：排队生成报表并返回下载响应，异常统一转换为 HTTP 错误
+    """
+    try:
+        result = await _run_report(report_type, request, end_dates, fetch, write, *args)
+        response = await _report_response(result)
+        if response is None:
+            # 缓存文件在命中后、打开前被临时目录清理删除，按缓存未命中重新生成
+            result = await _run_report(report_type, request, end_dates, fetch, write, *args)
+            response = await _report_response(result)
+        if response is None:
+            raise HTTPException(status_code=404, detail="报表生成失败，未找到文件")
+        return response
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"报表生成失败: {str(e)}")
 
 
-@router.post("/weekly", summary="生成周报", description="生成两周对比的周报")
+# ==================== API 路由 ====================
+@router.post("/daily", response_class=FileResponse, summary="生成日报", description="生成指定日期的门店日报")
+async def create_daily_report(request: DailyReportRequest):
+    """
+    生成日报
+    - 传入日期和可选的账号列表
+    - 返回 Excel 文件下载
+    """
+    return await _serve_report(
+        "daily", request, (request.report_date,),
+        fetch_daily_data, write_daily_xlsx,
+        request.report_date,
+        request.accounts
+    )
+
+
+@router.post("/weekly", response_class=FileResponse, summary="生成周报", description="生成两周对比的周报")
 async def create_weekly_report(request: WeeklyReportRequest):
     """
     生成周报
     - 传入两周的起止日期
     - 返回 Excel 文件下载
     """
-    try:
-        queue = get_task_queue()
-        file_path = await queue.run_task(
-            generate_weekly_report,
-            request.week1_start,
-            request.week1_end,
-            request.week2_start,
-            request.week2_end,
-            request.accounts
-        )
-
-        if not file_path or not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="报表生成失败，未找到文件")
-
-        filename = os.path.basename(file_path)
-        return FileResponse(
-            path=file_path,
-            filename=filename,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"报表生成失败: {str(e)}")
+    return await _serve_report(
+        "weekly", request, (request.week1_end, request.week2_end),
+        fetch_weekly_data, write_weekly_xlsx,
+        request.week1_start,
+        request.week1_end,
+        request.week2_start,
+        request.week2_end,
+        request.accounts
+    )
 
 
-@router.post("/monthly", summary="生成月报", description="生成两个月对比的月报")
+@router.post("/monthly", response_class=FileResponse, summary="生成月报", description="生成两个月对比的月报")
 async def create_monthly_report(request: MonthlyReportRequest):
     """
     生成月报
     - 传入两个月的起止日期
     - 返回 Excel 文件下载
     """
-    try:
-        queue = get_task_queue()
-        file_path = await queue.run_task(
-            generate_monthly_report,
-            request.month1_start,
-            request.month1_end,
-            request.month2_start,
-            request.month2_end,
-            request.accounts
-        )
-
-        if not file_path or not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="报表生成失败，未找到文件")
-
-        filename = os.path.basename(file_path)
-        return FileResponse(
-            path=file_path,
-            filename=filename,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"报表生成失败: {str(e)}")
+    return await _serve_report(
+        "monthly", request, (request.month1_end, request.month2_end),
+        fetch_weekly_data, write_weekly_xlsx,
+        request.month1_start,
+        request.month1_end,
+        request.month2_start,
+        request.month2_end,
+        request.accounts
+    )
 
 
-@router.post("/custom", summary="生成自定义报表", description="生成两个自定义时间段对比的报表")
+@router.post("/custom", response_class=FileResponse, summary="生成自定义报表", description="生成两个自定义时间段对比的报表")
 async def create_custom_report(request: CustomReportRequest):
     """
     生成自定义报表
@@ -162,28 +273,110 @@ async def create_custom_report(request: CustomReportRequest):
     - 可选传入账号列表和单个门店ID进行筛选
     - 返回 Excel 文件下载
     """
-    try:
-        queue = get_task_queue()
-        file_path = await queue.run_task(
-            generate_custom_report,
-            request.period1_start,
-            request.period1_end,
-            request.period2_start,
-            request.period2_end,
-            request.accounts,
-            request.shop_id
-        )
-
-        if not file_path or not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="报表生成失败，未找到文件")
+    return await _serve_report(
+        "custom", request, (request.period1_end, request.period2_end),
+        fetch_weekly_data, write_weekly_xlsx,
+        request.period1_start,
+        request.period1_end,
+        request.period2_start,
+        request.period2_end,
+        request.accounts,
+        request.shop_id
+    )
 
-        filename = os.path.basename(file_path)
-        return FileResponse(
-            path=file_path,
-            filename=filename,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"报表生成失败: {str(e)}")
+
+# ==================== 后台任务 ====================
+class TaskSubmitResponse(BaseModel):
+    """后台任务提交结果"""
+    task_id: str = Field(..., description="任务ID，用于查询结果")
+
+
+@router.post("/tasks/daily", status_code=202, response_model=TaskSubmitResponse,
+             summary="提交日报任务", description="后台生成日报，立即返回任务ID")
+async def submit_daily_report(request: DailyReportRequest):
+    """提交日报任务"""
+    task_id = await get_task_queue().submit(_run_report(
+        "daily", request, (request.report_date,),
+        fetch_daily_data, write_daily_xlsx,
+        request.report_date,
+        request.accounts,
+        for_task=True
+    ))
+    return {"task_id": task_id}
+
+
+@router.post("/tasks/weekly", status_code=202, response_model=TaskSubmitResponse,
+             summary="提交周报任务", description="后台生成周报，立即返回任务ID")
+async def submit_weekly_report(request: WeeklyReportRequest):
+    """提交周报任务"""
+    task_id = await get_task_queue().submit(_run_report(
+        "weekly", request, (request.week1_end, request.week2_end),
+        fetch_weekly_data, write_weekly_xlsx,
+        request.week1_start,
+        request.week1_end,
+        request.week2_start,
+        request.week2_end,
+        request.accounts,
+        for_task=True
+    ))
+    return {"task_id": task_id}
+
+
+@router.post("/tasks/monthly", status_code=202, response_model=TaskSubmitResponse,
+             summary="提交月报任务", description="后台生成月报，立即返回任务ID")
+async def submit_monthly_report(request: MonthlyReportRequest):
+    """提交月报任务"""
+    task_id = await get_task_queue().submit(_run_report(
+        "monthly", request, (request.month1_end, request.month2_end),
+        fetch_weekly_data, write_weekly_xlsx,
+        request.month1_start,
+        request.month1_end,
+        request.month2_start,
+        request.month2_end,
+        request.accounts,
+        for_task=True
+    ))
+    return {"task_id": task_id}
+
+
+@router.post("/tasks/custom", status_code=202, response_model=TaskSubmitResponse,
+             summary="提交自定义报表任务", description="后台生成自定义报表，立即返回任务ID")
+async def submit_custom_report(request: CustomReportRequest):
+    """提交自定义报表任务"""
+    task_id = await get_task_queue().submit(_run_report(
+        "custom", request, (request.period1_end, request.period2_end),
+        fetch_weekly_data, write_weekly_xlsx,
+        request.period1_start,
+        request.period1_end,
+        request.period2_start,
+        request.period2_end,
+        request.accounts,
+        request.shop_id,
+        for_task=True
+    ))
+    return {"task_id": task_id}
+
+
+@router.get("/result/{task_id}", summary="获取任务结果", description="任务完成后返回 Excel 文件，未完成返回 202")
+async def get_report_result(task_id: str):
+    """
+    获取后台任务结果
+    - 处理中: 返回 202 和任务状态
+    - 已完成: 返回 Excel 文件下载
+    - 失败: 返回对应错误
+    """
+    status = await asyncio.to_thread(read_task_status, task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    if status["status"] == TASK_PENDING:
+        return JSONResponse(status_code=202, content={"task_id": task_id, "status": TASK_PENDING})
+
+    if status["status"] == TASK_FAILED:
+        headers = {"Retry-After": str(RETRY_AFTER_SECONDS)} if status["status_code"] == 429 else None
+        raise HTTPException(status_code=status["status_code"], detail=status["error"], headers=headers)
+
+    response = await _open_report_file(status.get("file_path"))
+    if response is None:
+        raise HTTPException(status_code=404, detail="报表文件已失效，请重新提交任务")
+    return response
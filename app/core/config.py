@@ -4,8 +4,14 @@
 配置模块
 """
 
+from functools import lru_cache
+
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
+# USE_TMPFS 开启时使用的内存盘目录
+TMPFS_TEMP_DIR = "/dev/shm/jx_reports"
+
 
 class Settings(BaseSettings):
     # 数据库配置
@@ -17,18 +23,49 @@ class Settings(BaseSettings):
     DB_CHARSET: str = "utf8mb4"
 
     # 连接池配置
-    DB_POOL_SIZE: int = 20
-    DB_POOL_NAME: str = "jx_pool"
+    DB_POOL_SIZE: int = 20  # 连接池最大连接数
+    DB_POOL_TIMEOUT: int = 10  # 连接池耗尽时等待空闲连接的秒数
+    DB_POOL_MIN_CACHED: int = 5  # 启动时预先建立的空闲连接数，其余连接按需创建
+    DB_POOL_PING: int = 1  # 连接检查时机（DBUtils ping）：0 不检查，1 从连接池取出时，2 创建游标时，4 执行查询时，可按位组合
 
     # 队列配置
-    MAX_WORKERS: int = 5  # 最大并发处理数
+    MAX_WORKERS: int = 5  # 最大并发处理数（每个进程）
+    MAX_QUEUE_SIZE: int = 50  # 最大排队请求数，超出直接返回 429
+    ADMISSION_TIMEOUT: int = 60  # 排队等待超时秒数，超时返回 429
+    XLSX_PROCESSES: int = 0  # Excel 写入进程数，0 表示与 CPU 核数一致，不超过 MAX_WORKERS
+
+    # 服务进程配置
+    WEB_WORKERS: int = 1  # uvicorn 进程数，总并发 = WEB_WORKERS x MAX_WORKERS
+    LIMIT_CONCURRENCY: int = 1000  # 单进程最大连接数，超出返回 503
+    KEEPALIVE_TIMEOUT: int = 30  # Keep-Alive 超时秒数
 
     # 临时文件目录
     TEMP_DIR: str = "/tmp/jx_reports"
+    USE_TMPFS: bool = False  # 临时文件放到 /dev/shm（内存盘），忽略 TEMP_DIR
+    TEMP_TTL_SECONDS: int = 3600  # 后台任务结果文件的保留秒数
+    TEMP_MAX_BYTES: int = 512 * 1024 * 1024  # 临时目录总大小上限，超出时淘汰最久未访问的报表
+
+    # 报表缓存配置
+    REPORT_CACHE_TTL: int = 86400  # 已结束周期报表的缓存有效期（秒），0 表示不缓存
+    REPORT_CACHE_SETTLE_DAYS: int = 1  # 截止日期早于今天减该天数才视为已结束周期，留给 ETL 补数的时间
+    QUERY_CACHE_TTL: int = 120  # 账号、门店映射等基础数据查询的缓存秒数，0 表示不缓存
+
+    @model_validator(mode="after")
+    def _resolve_temp_dir(self):
+        """在配置加载时确定临时目录，主进程和 Excel 写入子进程得到相同的路径"""
+        if self.USE_TMPFS:
+            self.TEMP_DIR = TMPFS_TEMP_DIR
+        return self
 
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """获取配置（只读取一次 .env）"""
+    return Settings()
+
+
+settings = get_settings()
@@ -5,19 +5,59 @@
 确保整个应用只使用一个连接池实例
 """
 
-import mysql.connector
-from mysql.connector import pooling
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from contextlib import contextmanager
 from typing import Optional
 
+import MySQLdb
+from MySQLdb.cursors import Cursor, DictCursor
+from dbutils.pooled_db import PooledDB, TooManyConnections
+
 from app.core.config import settings
+from app.core.metrics import DB_POOL_SIZE, DB_POOL_IN_USE, DB_POOL_WAIT_SECONDS
+
+# 单个报表任务同时占用的最大连接数（日报主查询与门店批量汇总并行，周期重叠的对比报表两个周期并行查询）
+CONNECTIONS_PER_TASK = 2
+
+
+class PooledConnection:
+    """
+    连接池借出的连接
+    close() 归还连接并释放一个等待名额（只释放一次），其余属性直接转发给底层连接
+    """
+
+    def __init__(self, conn, slots: threading.BoundedSemaphore):
+        self._conn = conn
+        self._slots = slots
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            finally:
+                self._slots.release()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __del__(self):
+        # 调用方忘记 close() 时由回收兜底归还，避免名额泄漏
+        try:
+            self.close()
+        except Exception:
+            pass
 
 
 class DatabasePool:
     """数据库连接池单例类"""
 
     _instance: Optional['DatabasePool'] = None
-    _pool: Optional[pooling.MySQLConnectionPool] = None
+    _pool: Optional[PooledDB] = None
+    _slots: Optional[threading.BoundedSemaphore] = None
+    _query_executor: Optional[ThreadPoolExecutor] = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -29,7 +69,10 @@ class DatabasePool:
             self._init_pool()
 
     def _init_pool(self):
-        """初始化连接池"""
+        """
+        初始化连接池
+        使用 mysqlclient（libmysqlclient C 绑定）+ DBUtils 连接池，取行速度明显快于 mysql-connector
+        """
         db_config = {
             'host': settings.DB_HOST,
             'port': settings.DB_PORT,
@@ -38,20 +81,71 @@ class DatabasePool:
             'database': settings.DB_NAME,
             'charset': settings.DB_CHARSET,
             'use_unicode': True,
-            'autocommit': True
+            'autocommit': True,
+            # 游标默认返回字典，与原 mysql-connector 的 dictionary=True 行为一致
+            'cursorclass': DictCursor
         }
 
-        self._pool = mysql.connector.pooling.MySQLConnectionPool(
-            pool_name=settings.DB_POOL_NAME,
-            pool_size=settings.DB_POOL_SIZE,
-            pool_reset_session=True,
+        pool_size = settings.DB_POOL_SIZE
+        required = settings.MAX_WORKERS * CONNECTIONS_PER_TASK
+        if pool_size < required:
+            print(f"警告: 连接池大小 {pool_size} 小于并发所需连接数 {required}"
+                  f"（MAX_WORKERS={settings.MAX_WORKERS} x {CONNECTIONS_PER_TASK}），请求可能排队等待连接")
+
+        # 借出名额：get_connection 限时等待名额，名额数与最大连接数一致，拿到名额后连接池不会再阻塞
+        self._slots = threading.BoundedSemaphore(pool_size)
+        # reset=False: 连接为 autocommit，归还时只对显式开启的事务回滚，省去每次归还的 ROLLBACK 往返
+        # ping: 按 DB_POOL_PING 检查连接，默认取出时 ping，被 MySQL wait_timeout 断开的空闲连接自动重连
+        self._pool = PooledDB(
+            creator=MySQLdb,
+            mincached=min(settings.DB_POOL_MIN_CACHED, pool_size),
+            maxcached=pool_size,
+            maxconnections=pool_size,
+            blocking=True,
+            reset=False,
+            ping=settings.DB_POOL_PING,
             **db_config
         )
-        print(f"数据库连接池已初始化: pool_size={settings.DB_POOL_SIZE}")
 
-    def get_connection(self):
-        """获取数据库连接"""
-        return self._pool.get_connection()
+        # 报表内部与主查询并行的子查询使用的线程池，随连接池创建和关闭
+        # 与 TaskQueue 的任务线程池分开，避免任务线程等待子查询时互相占满
+        self._query_executor = ThreadPoolExecutor(
+            max_workers=settings.MAX_WORKERS,
+            thread_name_prefix="report-query"
+        )
+
+        pool = self._pool
+        DB_POOL_SIZE.set(pool_size)
+        DB_POOL_IN_USE.set_function(lambda: pool._connections)
+        print(f"数据库连接池已初始化: pool_size={pool_size}")
+
+    def get_connection(self) -> PooledConnection:
+        """
+        获取数据库连接，用完后调用 close() 归还
+        连接池耗尽时不立即报错，阻塞等待空闲连接，超过 DB_POOL_TIMEOUT 秒抛出 TooManyConnections
+        """
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=settings.DB_POOL_TIMEOUT):
+            raise TooManyConnections
+        try:
+            conn = self._pool.connection()
+        except BaseException:
+            self._slots.release()
+            raise
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+        return PooledConnection(conn, self._slots)
+
+    @contextmanager
+    def connection(self):
+        """
+        获取连接的上下文管理器
+        同一报表的多条查询复用一个连接，退出时归还连接池
+        """
+        conn = self.get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
 
     @contextmanager
     def get_cursor(self, dictionary=True):
@@ -60,18 +154,96 @@ class DatabasePool:
         自动管理连接和游标的关闭
         """
         conn = self.get_connection()
-        cursor = conn.cursor(dictionary=dictionary)
+        cursor = conn.cursor(DictCursor if dictionary else Cursor)
         try:
             yield cursor
         finally:
             cursor.close()
             conn.close()
 
+    def submit_query(self, func, *args) -> Future:
+        """在查询线程池中执行 func(*args)，func 自行从连接池借用连接"""
+        return self._query_executor.submit(func, *args)
 
-# 全局单例实例
-db_pool = DatabasePool()
+    def close(self):
+        """关闭查询线程池和连接池中的空闲连接（应用关闭时调用）"""
+        if self._query_executor is not None:
+            self._query_executor.shutdown(wait=False, cancel_futures=True)
+            self._query_executor = None
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+            print("数据库连接池已关闭")
 
 
-def get_db_pool() -> DatabasePool:
-    """获取数据库连接池实例"""
+# 全局单例实例，由 init_db_pool 在应用启动时创建
+# 不在导入时建立连接：连接失败会在 lifespan 中报告，且 reloader 重复导入模块时不会重复建池
+db_pool: Optional[DatabasePool] = None
+
+
+def init_db_pool() -> DatabasePool:
+    """初始化数据库连接池（每个进程只创建一次）"""
+    global db_pool
+    if db_pool is None:
+        db_pool = DatabasePool()
     return db_pool
+
+
+def close_db_pool():
+    """关闭数据库连接池"""
+    global db_pool
+    if db_pool is not None:
+        db_pool.close()
+        db_pool = None
+
+
+def get_db_pool() -> DatabasePool:
+    """获取数据库连接池实例，未初始化时按需创建（便于在脚本中直接调用报表函数）"""
+    return db_pool or init_db_pool()
+
+
+def fetch_all(sql: str, params=(), conn=None) -> list:
+    """
+    执行查询并返回全部结果
+    传入 conn 时复用调用方的连接（只创建游标），否则从连接池借用独立连接
+    """
+    if conn is None:
+        with get_db_pool().get_cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+@contextmanager
+def use_connection(conn=None):
+    """
+    获取报表查询使用的连接
+    传入 conn 时直接使用（由调用方负责归还），否则从连接池借用，退出时归还
+    """
+    if conn is not None:
+        yield conn
+        return
+
+    with get_db_pool().connection() as pooled_conn:
+        yield pooled_conn
+
+
+@contextmanager
+def parallel_query(func, *args):
+    """
+    与主查询并行执行 func(*args)，产出其 Future
+    退出时（包括主查询出错、没有数据等异常）子查询尚未开始则取消，已在执行则等待结束，
+    不在报表失败后留下仍占用连接的后台查询
+    """
+    future = get_db_pool().submit_query(func, *args)
+    try:
+        yield future
+    finally:
+        if not future.cancel():
+            wait([future])
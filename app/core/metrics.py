@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prometheus 监控指标
+通过 /metrics 接口暴露，每个 worker 进程各自统计
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# 数据库连接池
+DB_POOL_SIZE = Gauge("db_pool_size", "数据库连接池大小")
+DB_POOL_IN_USE = Gauge("db_pool_in_use", "已借出的数据库连接数")
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "获取数据库连接的等待时间（秒）",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10)
+)
+
+# 报表缓存
+REPORT_CACHE_HITS = Counter("report_cache_hits", "报表缓存命中次数", ["report_type"])
+REPORT_CACHE_MISSES = Counter("report_cache_misses", "报表缓存未命中次数", ["report_type"])
+
+# 基础数据查询缓存
+QUERY_CACHE_HITS = Counter("query_cache_hits", "查询缓存命中次数", ["query"])
+QUERY_CACHE_MISSES = Counter("query_cache_misses", "查询缓存未命中次数", ["query"])
+
+# 临时目录
+TEMP_DIR_BYTES = Gauge("temp_dir_bytes", "临时目录占用的字节数（上次清理时统计）")
+
+# 请求队列
+REPORT_QUEUE_AVAILABLE = Gauge("report_queue_available", "空闲的报表处理名额")
+REPORT_QUEUE_WAITING = Gauge("report_queue_waiting", "排队等待中的报表请求数")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询结果缓存
+账号、门店映射等基础数据变化很少，每次生成报表都重新查询没有必要，
+按 SQL + 参数缓存查询结果（或解析后的结果），在 QUERY_CACHE_TTL 秒内直接复用
+（进程内缓存，多进程部署时每个进程各自缓存）
+"""
+
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+from app.core.database import fetch_all
+from app.core.metrics import QUERY_CACHE_HITS, QUERY_CACHE_MISSES
+
+# 最多缓存的查询结果数，超出时先清理过期条目，仍超出则清空
+MAX_ENTRIES = 256
+
+_cache: dict = {}
+_lock = threading.Lock()
+
+
+def _cache_key(name: str, sql: str, params) -> str:
+    """按查询名称、SQL 模板和参数计算缓存键"""
+    return hashlib.blake2b((name + sql + repr(params)).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def cached_query(name: str, sql: str, params=(), ttl: int = None, conn=None,
+                 parse: Optional[Callable[[list], Any]] = None) -> Any:
+    """
+    执行查询并缓存结果
+    只用于基础数据查询；返回的结果在多个请求间共享，调用方不要修改
+    参数:
+        name: 查询名称，用于监控指标；同一名称的 parse 必须相同
+        ttl: 缓存秒数，默认使用 QUERY_CACHE_TTL，0 表示不缓存
+        conn: 未命中时使用的连接，不传则从连接池借用
+        parse: 查询结果的处理函数（如解析 JSON），缓存处理后的结果，命中时不再重复处理
+    """
+    if ttl is None:
+        ttl = settings.QUERY_CACHE_TTL
+
+    key = _cache_key(name, sql, params)
+    now = time.monotonic()
+    if ttl > 0:
+        with _lock:
+            entry = _cache.get(key)
+        if entry is not None and entry[0] > now:
+            QUERY_CACHE_HITS.labels(name).inc()
+            return entry[1]
+
+    QUERY_CACHE_MISSES.labels(name).inc()
+    result = fetch_all(sql, params, conn)
+    if parse is not None:
+        result = parse(result)
+
+    if ttl > 0:
+        with _lock:
+            if len(_cache) >= MAX_ENTRIES:
+                for k in [k for k, (expires, _) in _cache.items() if expires <= now]:
+                    del _cache[k]
+                if len(_cache) >= MAX_ENTRIES:
+                    _cache.clear()
+            _cache[key] = (now + ttl, result)
+    return result
+
+
+def clear_query_cache():
+    """清空查询缓存（基础数据变更后需要立即生效时调用）"""
+    with _lock:
+        _cache.clear()
@@ -6,17 +6,126 @@
 """
 
 import asyncio
-from typing import Callable, Any
-from functools import wraps
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Any, Optional
+from functools import partial, wraps
 
 from app.core.config import settings
+from app.core.metrics import REPORT_QUEUE_AVAILABLE, REPORT_QUEUE_WAITING
+
+logger = logging.getLogger(__name__)
+
+# 后台任务状态
+TASK_PENDING = "pending"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+
+_TASK_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# 写入子进程启动时预先导入的模块
+XLSX_WRITER_MODULE = "app.services.report_writer"
+
+
+class QueueFullError(Exception):
+    """排队请求过多或排队超时，调用方应稍后重试"""
+
+
+def _task_status_path(task_id: str) -> str:
+    """任务状态文件路径"""
+    return os.path.join(settings.TEMP_DIR, "tasks", f"{task_id}.json")
+
+
+def write_task_status(task_id: str, status: str, **fields):
+    """
+    写入任务状态
+    状态保存在 TEMP_DIR 下，多进程部署时任一进程都能查询
+    """
+    path = _task_status_path(task_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"task_id": task_id, "status": status, **fields}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def read_task_status(task_id: str) -> Optional[dict]:
+    """读取任务状态，任务不存在时返回 None"""
+    if not _TASK_ID_PATTERN.fullmatch(task_id):
+        return None
+    try:
+        with open(_task_status_path(task_id), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _process_alive(pid: int) -> bool:
+    """进程是否仍在运行"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def fail_interrupted_tasks() -> int:
+    """
+    将所属进程已不在运行的 pending 任务标记为失败，返回标记数
+    后台任务只在提交它的进程内存中执行，进程重启后不会继续，状态文件会一直停在 pending；
+    多进程部署时其他进程的任务仍在执行，只处理所属进程已退出（或 pid 被当前进程复用）的任务
+    """
+    try:
+        names = os.listdir(os.path.join(settings.TEMP_DIR, "tasks"))
+    except FileNotFoundError:
+        return 0
+
+    interrupted = 0
+    for name in names:
+        task_id, ext = os.path.splitext(name)
+        if ext != ".json":
+            continue
+        try:
+            status = read_task_status(task_id)
+        except ValueError:
+            continue
+        if status is None or status["status"] != TASK_PENDING:
+            continue
+        pid = status.get("pid")
+        if pid is not None and pid != os.getpid() and _process_alive(pid):
+            continue
+        write_task_status(task_id, TASK_FAILED, status_code=500, error="任务因服务重启已中断，请重新提交")
+        interrupted += 1
+    return interrupted
+
+
+def _preload_module(module_name: str):
+    """在写入子进程中预先导入模块（进程池预热任务）"""
+    importlib.import_module(module_name)
 
 
 class TaskQueue:
     """任务队列管理器"""
 
     _instance = None
-    _semaphore: asyncio.Semaphore = None
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _executor: Optional[ThreadPoolExecutor] = None
+    _process_pool: Optional[ProcessPoolExecutor] = None
+    _jobs: set = set()
+    _inflight: dict = {}
+    _waiting: int = 0
+    _running: int = 0
 
     def __new__(cls):
         if cls._instance is None:
@@ -24,26 +133,178 @@ class TaskQueue:
         return cls._instance
 
     def __init__(self):
-        # 注意：Semaphore 需要在事件循环中创建
+        # 注意：Semaphore 需要在事件循环中创建，见 start()
         pass
 
-    def get_semaphore(self) -> asyncio.Semaphore:
-        """获取或创建信号量"""
-        if self._semaphore is None:
-            self._semaphore = asyncio.Semaphore(settings.MAX_WORKERS)
-        return self._semaphore
+    def start(self):
+        """
+        绑定当前事件循环并创建信号量（在 lifespan 启动阶段调用）
+        启动时一次性创建，不在请求中按需创建；事件循环也只获取一次，后续直接复用
+        """
+        self._loop = asyncio.get_running_loop()
+        # 上次运行遗留的 pending 任务不会再执行，标记为失败
+        interrupted = fail_interrupted_tasks()
+        if interrupted:
+            logger.warning(f"已将 {interrupted} 个中断的后台任务标记为失败")
+        self._semaphore = asyncio.Semaphore(settings.MAX_WORKERS)
+        # 名额占用数和排队数由 _admit 自行计数，不读取信号量的内部状态
+        REPORT_QUEUE_AVAILABLE.set_function(lambda: settings.MAX_WORKERS - self._running)
+        REPORT_QUEUE_WAITING.set_function(lambda: self._waiting)
+        # 启动时创建并预热写入进程池
+        self.get_process_pool()
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        """
+        获取或创建报表专用线程池
+        线程数与 MAX_WORKERS 一致，查询阶段的阻塞 I/O 在各自线程中并行等待，
+        不占用事件循环的默认线程池
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.MAX_WORKERS,
+                thread_name_prefix="report-worker"
+            )
+        return self._executor
+
+    def get_process_pool(self) -> ProcessPoolExecutor:
+        """
+        获取或创建 Excel 写入专用进程池
+        写入阶段是纯 Python 的 CPU 计算，放在线程中会被 GIL 串行化；
+        使用 spawn 启动子进程，不继承主进程的线程和数据库连接。
+        run_cpu 只在并发名额内调用，同时写入的报表不超过 MAX_WORKERS，进程数按此封顶；
+        新建（含损坏后重建）时即预热，每个子进程预先导入写入模块，
+        报表请求不再承担 spawn 和导入 openpyxl / xlsxwriter 的开销
+        """
+        if self._process_pool is None:
+            workers = min(settings.XLSX_PROCESSES or os.cpu_count(), settings.MAX_WORKERS)
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            # 子进程按提交数量逐个启动，每个进程提交一次预热任务
+            for _ in range(workers):
+                pool.submit(_preload_module, XLSX_WRITER_MODULE)
+            self._process_pool = pool
+        return self._process_pool
+
+    def shutdown(self):
+        """关闭报表线程池和进程池（应用关闭时调用）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+    @asynccontextmanager
+    async def _admit(self):
+        """
+        获取一个并发名额
+        排队人数超过 MAX_QUEUE_SIZE 或等待超过 ADMISSION_TIMEOUT 秒时抛出 QueueFullError，
+        不无限期占用连接
+        """
+        semaphore = self._semaphore
+        assert semaphore is not None, "TaskQueue 未启动，需先在 lifespan 中调用 start()"
+        if not semaphore.locked():
+            # 有空闲名额时直接获取，不会挂起
+            await semaphore.acquire()
+        else:
+            if self._waiting >= settings.MAX_QUEUE_SIZE:
+                raise QueueFullError("当前排队请求过多，请稍后重试")
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=settings.ADMISSION_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise QueueFullError("排队等待超时，请稍后重试")
+            finally:
+                self._waiting -= 1
+
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            semaphore.release()
 
     async def run_task(self, func: Callable, *args, **kwargs) -> Any:
         """
         在队列中运行任务
-        使用信号量控制并发数
-        """
-        semaphore = self.get_semaphore()
-        async with semaphore:
-            # 在线程池中运行同步任务
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, lambda: func(*args, **kwargs))
-            return result
+        使用信号量控制并发数，任务在报表专用线程池中执行
+        """
+        async with self._admit():
+            return await self._loop.run_in_executor(self.get_executor(), partial(func, *args, **kwargs))
+
+    async def run_cpu(self, func: Callable, *args) -> Any:
+        """
+        在进程池中运行 CPU 密集型函数
+        func 和参数需可 pickle（模块级函数 + 基础类型数据）
+        子进程异常退出（如 OOM 被杀）后进程池不可再用，丢弃后下次调用重新创建并预热
+        """
+        pool = self.get_process_pool()
+        try:
+            return await self._loop.run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            # 同一进程池上的多个任务会同时失败，只重置一次
+            if self._process_pool is pool:
+                logger.warning("写入进程池已损坏，下次请求时重新创建")
+                self._process_pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    async def run_report(self, fetch: Callable, write: Callable, *args) -> str:
+        """
+        在队列中生成报表
+        fetch(*args) 在线程池中查询数据，write(data) 在进程池中写入 Excel，
+        两个阶段共占一个并发名额
+        """
+        async with self._admit():
+            data = await self._loop.run_in_executor(self.get_executor(), partial(fetch, *args))
+            return await self.run_cpu(write, data)
+
+    async def run_task_dedup(self, key: str, coro_func: Callable[..., Awaitable], *args) -> Any:
+        """
+        合并相同 key 的并发任务（singleflight）
+        同一 key 的任务正在执行时，后续调用直接等待它的结果，不重复执行 coro_func(*args)
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_func(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: 某个等待方断开连接时不取消共享的任务
+        return await asyncio.shield(task)
+
+    async def submit(self, coro: Awaitable[str]) -> str:
+        """
+        提交后台任务，立即返回任务ID
+        coro 为生成报表文件的协程（内部通过 run_report 排队），结果通过 read_task_status 查询
+        """
+        task_id = uuid.uuid4().hex
+        try:
+            # 状态文件读写在线程中执行，不阻塞事件循环
+            # 记录所属进程，进程重启后由 fail_interrupted_tasks 标记为失败
+            await asyncio.to_thread(write_task_status, task_id, TASK_PENDING, pid=os.getpid())
+        except BaseException:
+            coro.close()
+            raise
+        job = self._loop.create_task(self._run_job(task_id, coro))
+        # 保留引用，避免任务未完成就被回收
+        self._jobs.add(job)
+        job.add_done_callback(self._jobs.discard)
+        return task_id
+
+    async def _run_job(self, task_id: str, coro: Awaitable[str]):
+        """执行后台任务并记录结果"""
+        try:
+            file_path = await coro
+            status = {"status": TASK_DONE, "file_path": file_path}
+        except ValueError as e:
+            status = {"status": TASK_FAILED, "status_code": 400, "error": str(e)}
+        except QueueFullError as e:
+            status = {"status": TASK_FAILED, "status_code": 429, "error": str(e)}
+        except Exception as e:
+            status = {"status": TASK_FAILED, "status_code": 500, "error": f"报表生成失败: {str(e)}"}
+        await asyncio.to_thread(partial(write_task_status, task_id, **status))
 
 
 # 全局队列实例
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+报表结果缓存
+已结束周期（截止日期早于今天减 REPORT_CACHE_SETTLE_DAYS 天）的报表内容不会再变化，
+按报表类型 + 请求参数 + 报表代码版本的哈希缓存生成好的 Excel 文件
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from app.core.config import settings
+
+# 决定报表内容和格式的代码文件（相对 app 目录）
+REPORT_SOURCES = ("services/report.py", "services/report_writer.py")
+
+
+def _code_version() -> str:
+    """报表代码的内容哈希：升级部署后旧版本生成的缓存不再命中（过期后由清理任务删除）"""
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.blake2b(digest_size=8)
+    for name in REPORT_SOURCES:
+        with open(os.path.join(app_dir, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+CODE_VERSION = _code_version()
+
+
+def _cache_root() -> str:
+    """缓存根目录"""
+    return os.path.join(settings.TEMP_DIR, "cache")
+
+
+def is_closed_period(*end_dates: date) -> bool:
+    """
+    所有截止日期都早于今天减 REPORT_CACHE_SETTLE_DAYS 天的报表视为已结束周期，可以缓存
+    最近几天的数据可能还会被 ETL 补录，不缓存，避免补数后仍返回旧报表
+    """
+    if settings.REPORT_CACHE_TTL <= 0:
+        return False
+    settled = date.today() - timedelta(days=settings.REPORT_CACHE_SETTLE_DAYS)
+    return all(d < settled for d in end_dates)
+
+
+def report_cache_key(report_type: str, params: dict) -> str:
+    """
+    计算缓存键
+    列表参数排序后参与计算（账号顺序不影响报表内容），报表代码版本也参与计算
+    """
+    normalized = {k: sorted(v) if isinstance(v, list) else v for k, v in params.items()}
+    digest = hashlib.blake2b(
+        json.dumps([CODE_VERSION, normalized], sort_keys=True, default=str).encode("utf-8"),
+        digest_size=16
+    ).hexdigest()
+    return f"{report_type}_{digest}"
+
+
+def get_cached_report(cache_key: str) -> Optional[str]:
+    """查找未过期的缓存文件，未命中返回 None"""
+    cache_dir = os.path.join(_cache_root(), cache_key)
+    try:
+        names = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return None
+
+    for name in names:
+        path = os.path.join(cache_dir, name)
+        try:
+            now = time.time()
+            mtime = os.path.getmtime(path)
+            if now - mtime < settings.REPORT_CACHE_TTL:
+                # 记录访问时间（保留修改时间，不影响过期判断），临时目录超限时按访问时间淘汰
+                os.utime(path, (now, mtime))
+                return path
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def store_report(cache_key: str, file_path: str) -> str:
+    """
+    将生成好的报表移入缓存目录，返回缓存文件路径
+    保留原文件名，下载时文件名不变
+    """
+    cache_dir = os.path.join(_cache_root(), cache_key)
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_path = os.path.join(cache_dir, os.path.basename(file_path))
+    os.replace(file_path, cached_path)
+    return cached_path
+
+
+def sweep_report_cache() -> int:
+    """清理过期缓存，返回删除的缓存条目数"""
+    root = _cache_root()
+    if not os.path.isdir(root):
+        return 0
+
+    removed = 0
+    now = time.time()
+    for entry in os.scandir(root):
+        if not entry.is_dir():
+            continue
+        try:
+            mtimes = [f.stat().st_mtime for f in os.scandir(entry.path)]
+        except FileNotFoundError:
+            continue
+        if not mtimes or now - max(mtimes) >= settings.REPORT_CACHE_TTL:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
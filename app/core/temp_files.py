@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+临时目录清理
+后台任务结果、任务状态和报表缓存都保存在 TEMP_DIR 下，
+TEMP_DIR 放在 tmpfs 时占用的是内存，需要定期删除过期文件并限制总大小
+"""
+
+import json
+import os
+import time
+from typing import Callable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import TEMP_DIR_BYTES
+from app.core.queue import TASK_PENDING
+from app.core.report_cache import sweep_report_cache
+
+
+def _remove(path: str) -> bool:
+    """删除文件，文件已不存在时返回 False"""
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _is_pending_task(path: str) -> bool:
+    """任务状态文件是否仍为 pending（任务执行中）"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("status") == TASK_PENDING
+    except (OSError, ValueError):
+        return False
+
+
+def _remove_expired(directory: str, now: float, keep: Optional[Callable[[str], bool]] = None) -> int:
+    """删除目录下（不含子目录）超过 TEMP_TTL_SECONDS 的文件，keep(path) 为真的文件保留"""
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+
+    for entry in entries:
+        try:
+            if entry.is_file() and now - entry.stat().st_mtime >= settings.TEMP_TTL_SECONDS:
+                if keep is None or not keep(entry.path):
+                    removed += _remove(entry.path)
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def _scan_files(root: str):
+    """遍历目录下的所有文件，返回 (路径, stat)"""
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                yield path, os.stat(path)
+            except FileNotFoundError:
+                continue
+
+
+def sweep_temp_files() -> Tuple[int, int]:
+    """
+    清理临时目录，返回 (过期删除数, 超限淘汰数)
+    - 报表缓存按 REPORT_CACHE_TTL 过期
+    - 后台任务结果和任务状态文件超过 TEMP_TTL_SECONDS 删除（pending 状态的任务仍在执行，不删除）
+    - 总大小仍超过 TEMP_MAX_BYTES 时，按最近访问时间从旧到新删除报表文件
+    """
+    root = settings.TEMP_DIR
+    now = time.time()
+    expired = sweep_report_cache()
+    expired += _remove_expired(root, now)
+    expired += _remove_expired(os.path.join(root, "tasks"), now, keep=_is_pending_task)
+
+    files = list(_scan_files(root))
+    total = sum(st.st_size for _, st in files)
+    evicted = 0
+    if total > settings.TEMP_MAX_BYTES:
+        reports = sorted(
+            ((path, st) for path, st in files if path.endswith(".xlsx")),
+            key=lambda item: item[1].st_atime
+        )
+        for path, st in reports:
+            if total <= settings.TEMP_MAX_BYTES:
+                break
+            if _remove(path):
+                evicted += 1
+            total -= st.st_size
+
+    TEMP_DIR_BYTES.set(total)
+    return expired, evicted
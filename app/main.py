@@ -5,13 +5,34 @@
 FastAPI 主入口
 """
 
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from app.api.routes import router as report_router
 from app.core.config import settings
-from app.services.report import ensure_temp_dir
+from app.core.database import init_db_pool, close_db_pool
+from app.core.queue import get_task_queue
+from app.core.temp_files import sweep_temp_files
+from app.services.report_writer import ensure_temp_dir
+
+# 临时目录清理间隔（秒）
+TEMP_SWEEP_INTERVAL = 60
+
+
+async def sweep_temp_periodically():
+    """定期清理临时目录（过期缓存和任务结果，超出大小上限时淘汰最久未访问的报表）"""
+    while True:
+        await asyncio.sleep(TEMP_SWEEP_INTERVAL)
+        try:
+            expired, evicted = await asyncio.to_thread(sweep_temp_files)
+            if expired or evicted:
+                print(f"已清理临时文件: 过期 {expired} 个，超限淘汰 {evicted} 个")
+        except Exception as e:
+            print(f"清理临时目录失败: {e}")
 
 
 @asynccontextmanager
@@ -22,15 +43,41 @@ async def lifespan(app: FastAPI):
     print("江鑫数据报表 API 服务启动中...")
     print(f"最大并发处理数: {settings.MAX_WORKERS}")
     print(f"数据库连接池大小: {settings.DB_POOL_SIZE}")
+    print(f"临时目录: {settings.TEMP_DIR}")
+    loop_cls = type(asyncio.get_running_loop())
+    print(f"事件循环: {loop_cls.__module__}.{loop_cls.__name__}")
     print("=" * 60)
 
+    # 初始化数据库连接池，连接失败时在启动阶段直接报错
+    app.state.db_pool = init_db_pool()
+
+    # 在当前事件循环中创建队列信号量
+    get_task_queue().start()
+
     # 确保临时目录存在
     ensure_temp_dir()
+    sweeper = asyncio.create_task(sweep_temp_periodically())
 
     yield
 
     # 关闭时
     print("服务关闭中...")
+    sweeper.cancel()
+    get_task_queue().shutdown()
+    close_db_pool()
+
+
+class JsonGZipMiddleware(GZipMiddleware):
+    """
+    GZip 压缩中间件
+    报表接口返回的 xlsx 本身就是 zip 压缩格式，再次压缩只浪费 CPU，直接跳过
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(report_router.prefix):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
 
 
 # 创建 FastAPI 应用
@@ -52,6 +99,9 @@ app = FastAPI(
 2. 系统会排队处理请求（最多同时处理5个）
 3. 处理完成后返回 Excel 文件下载
 
+耗时较长的报表可使用 `/api/report/tasks/*` 接口后台生成，
+拿到 `task_id` 后轮询 `/api/report/result/{task_id}` 下载文件。
+
 ## 注意事项
 
 - 所有日期格式为: `YYYY-MM-DD`
@@ -70,6 +120,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# GZip 压缩（JSON 等文本响应）
+app.add_middleware(JsonGZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # 注册路由
 app.include_router(report_router)
 
@@ -81,6 +134,12 @@ async def health_check():
     return {"status": "ok", "message": "服务运行正常"}
 
 
+@app.get("/metrics", tags=["系统"])
+async def metrics():
+    """Prometheus 监控指标"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/", tags=["系统"])
 async def root():
     """根路径"""
@@ -92,6 +151,8 @@ async def root():
             "日报": "POST /api/report/daily",
             "周报": "POST /api/report/weekly",
             "月报": "POST /api/report/monthly",
-            "自定义": "POST /api/report/custom"
+            "自定义": "POST /api/report/custom",
+            "后台任务": "POST /api/report/tasks/{daily|weekly|monthly|custom}",
+            "任务结果": "GET /api/report/result/{task_id}"
         }
     }
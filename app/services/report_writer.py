@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+报表 Excel 写入
+只做纯计算和文件写入，不访问数据库，可在进程池中执行
+（本模块不能导入数据库相关模块，否则子进程启动时会各自建立连接池）
+"""
+
+import io
+import os
+import uuid
+from collections import defaultdict
+from copy import copy
+from datetime import datetime
+from typing import Tuple, Union
+
+import openpyxl
+import xlsxwriter
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from openpyxl.utils import get_column_letter
+
+from app.core.config import settings
+
+
+# ==================== 样式 ====================
+# 样式对象在模块加载时创建一次，所有报表共用
+# openpyxl 颜色一律写 8 位 ARGB（FF 开头）：6 位颜色会被补成 "00xxxxxx"（透明度 00），部分软件显示为无色
+THIN_SIDE = Side(style='thin')
+THIN_BORDER = Border(left=THIN_SIDE, right=THIN_SIDE, top=THIN_SIDE, bottom=THIN_SIDE)
+CENTER_ALIGN = Alignment(horizontal='center', vertical='center')
+
+GRAY_FILL = PatternFill(start_color="FFD3D3D3", end_color="FFD3D3D3", fill_type="solid")
+
+HEADER_FONT = Font(bold=True, size=10)
+TITLE_FONT = Font(bold=True, size=12)
+SECTION_FONT = Font(bold=True, size=10, color="FF0066CC")
+STATUS_BAD_FONT = Font(bold=True, size=10, color="FFFF0000")
+STATUS_OK_FONT = Font(bold=True, size=10, color="FF008000")
+QUALIFIED_FONTS = {
+    "未达标": Font(bold=True, color="FFFF0000"),
+    "达标": Font(bold=True, color="FF008000"),
+}
+
+# 周报使用 xlsxwriter 写入：格式属性在每个工作簿中用 add_format 创建一次
+# 字符串原样写入，不把 "=" 开头的文本当作公式、不把网址转成超链接
+XLSXWRITER_OPTIONS = {'strings_to_formulas': False, 'strings_to_urls': False}
+WEEKLY_CELL_FORMAT = {'border': 1, 'align': 'center', 'valign': 'vcenter'}
+WEEKLY_FORMATS = {
+    'cell': WEEKLY_CELL_FORMAT,
+    'header': {**WEEKLY_CELL_FORMAT, 'bold': True, 'font_size': 10, 'bg_color': '#CCFFCC'},
+    'diff': {**WEEKLY_CELL_FORMAT, 'font_color': '#FF0000'},
+    # 区块中被合并的单元格只保留左右边框，区块最后一行加下边框
+    'merged': {'left': 1, 'right': 1},
+    'merged_last': {'left': 1, 'right': 1, 'bottom': 1},
+}
+
+
+# ==================== 辅助函数 ====================
+def ensure_temp_dir():
+    """确保临时目录存在"""
+    if not os.path.exists(settings.TEMP_DIR):
+        os.makedirs(settings.TEMP_DIR, exist_ok=True)
+
+
+def generate_report_name(prefix: str, ext: str = "xlsx") -> str:
+    """生成唯一的报表文件名"""
+    unique_id = uuid.uuid4().hex[:8]
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    return f"{prefix}_{timestamp}_{unique_id}.{ext}"
+
+
+def generate_temp_filename(prefix: str, ext: str = "xlsx") -> str:
+    """生成唯一的临时文件名"""
+    ensure_temp_dir()
+    return os.path.join(settings.TEMP_DIR, generate_report_name(prefix, ext))
+
+
+def save_workbook(wb, prefix: str, in_memory: bool = False) -> Union[str, Tuple[str, bytes]]:
+    """
+    保存工作簿
+    in_memory=False: 写入临时目录，返回文件路径
+    in_memory=True: 不落盘，返回 (文件名, xlsx 内容)，由接口直接分块返回
+    """
+    if in_memory:
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        return generate_report_name(prefix), buffer.getvalue()
+
+    output_filename = generate_temp_filename(prefix)
+    wb.save(output_filename)
+    return output_filename
+
+
+def save_workbook_bytes(buffer: io.BytesIO, prefix: str, in_memory: bool = False) -> Union[str, Tuple[str, bytes]]:
+    """保存已写入内存的 xlsxwriter 工作簿，返回值同 save_workbook"""
+    if in_memory:
+        return generate_report_name(prefix), buffer.getvalue()
+
+    output_filename = generate_temp_filename(prefix)
+    with open(output_filename, 'wb') as f:
+        f.write(buffer.getbuffer())
+    return output_filename
+
+
+# Sheet 名称中不允许出现的字符，translate 一次删除
+SHEET_NAME_ILLEGAL_CHARS = str.maketrans('', '', '\\/*?:[]')
+
+
+def clean_sheet_name(name, max_length=31):
+    """清理 Sheet 名称，符合 Excel 规范"""
+    if not name:
+        return "Sheet"
+    name = name.translate(SHEET_NAME_ILLEGAL_CHARS)
+    if len(name) > max_length:
+        name = name[:max_length]
+    return name or "Sheet"
+
+
+def styled_row(ws, values, font=None, fill=None, alignment=None, border=None):
+    """
+    构造带样式的一行单元格（write_only 和普通工作表都可使用）
+    write_only 模式下单元格写入后不能再修改，样式需在 append 前设置
+    整行样式相同：只在第一个单元格上登记样式，其余单元格复制样式索引
+    """
+    cells = []
+    style = None
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        if style is None:
+            if font:
+                cell.font = font
+            if fill:
+                cell.fill = fill
+            if alignment:
+                cell.alignment = alignment
+            if border:
+                cell.border = border
+            style = cell._style
+        else:
+            cell._style = copy(style)
+        cells.append(cell)
+    return cells
+
+
+def safe_get_val(data, key, default=0):
+    """安全获取值，处理None的情况"""
+    if not data:
+        return default
+    value = data.get(key)
+    if value is None:
+        return default
+    return value
+
+
+def calc_rate(numerator, denominator):
+    """计算比率（百分数，保留一位小数），分母为0时返回整数0，显示为 "0%"；写入单元格时再加 %"""
+    if denominator and denominator > 0:
+        return float(round(numerator / denominator * 100, 1))
+    return 0
+
+
+def calc_avg_price(total, count):
+    """计算均价"""
+    if count and count > 0:
+        return round(total / count, 2)
+    return 0
+
+
+# ==================== 日报写入 ====================
+# 日报中的计数列和金额列
+DAILY_COUNT_FIELDS = (
+    'exposure_users', 'visit_users', 'order_users', 'verify_users', 'order_coupon_count',
+    'verify_coupon_count', 'phone_clicks', 'address_clicks', 'new_good_review_count', 'consult_users',
+    'new_collect_users', 'checkin_count', 'new_review_count', 'promotion_order_count', 'is_force_offline',
+)
+DAILY_AMOUNT_FIELDS = (
+    'promotion_cost', 'order_sale_amount', 'verify_sale_amount', 'verify_after_discount',
+    'click_avg_price', 'ad_balance',
+)
+
+
+def write_daily_xlsx(data: dict, in_memory: bool = False) -> Union[str, Tuple[str, bytes]]:
+    """
+    将日报数据写入 Excel，返回值见 save_workbook
+    data 由 fetch_daily_data 查询得到
+    """
+    report_date = data['report_date']
+    rows = data['rows']
+    shop_mapping = data['shop_mapping']
+    region_mapping = data['region_mapping']
+    coupon_7days_mapping = data['coupon_7days']
+    ad_today_mapping = data['ad_today']
+
+    # 创建 Excel 工作簿（write_only 模式，逐行写入，不在内存中保留单元格）
+    wb = openpyxl.Workbook(write_only=True)
+    ws_summary = wb.create_sheet("汇总")
+
+    # write_only 模式下列宽需在写入数据前设置
+    summary_widths = [6, 8, 5, 12, 8, 8, 46, 10, 10, 10, 10, 10, 10, 10, 10, 12, 8, 12, 12, 12, 12, 14, 14]
+    for col_idx, width in enumerate(summary_widths, start=1):
+        ws_summary.column_dimensions[get_column_letter(col_idx)].width = width
+
+    # 格式化日期
+    weekday_names = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+    weekday = weekday_names[report_date.weekday()]
+    date_str = report_date.strftime('%m月%d日')
+    date_short = report_date.strftime('%m/%d')
+
+    # 汇总表头
+    summary_headers = [
+        '星期', '日期', '序号', '运营', '城市', '销售', '门店',
+        '曝光人数', '访问人数', '下单人数', '核销人数', '下单券数', '核销券数',
+        '电话点击', '地址点击', '推广通消耗', '好评', '意向转化率',
+        '下单售价金额', '核销售价金额', '优惠后核销金额',
+        '下单人数商圈排名', '核销金额商圈排名'
+    ]
+    ws_summary.append(styled_row(
+        ws_summary, summary_headers,
+        font=HEADER_FONT, fill=GRAY_FILL, alignment=CENTER_ALIGN, border=THIN_BORDER
+    ))
+
+    sheet_names_used = defaultdict(int)
+
+    for idx, row in enumerate(rows, start=1):
+        # 数值列为 NULL 或 0 时统一写 0，金额保留两位小数；每个字段只取一次
+        counts = {key: row[key] or 0 for key in DAILY_COUNT_FIELDS}
+        amounts = {key: round(row[key] or 0, 2) for key in DAILY_AMOUNT_FIELDS}
+
+        shop_id = str(row['shop_id'])
+        shop_name = row['shop_name'] or f'门店{shop_id}'
+
+        shop_info = shop_mapping.get(shop_id, {})
+        operator = shop_info.get('operator', '')
+        sales = shop_info.get('sales', '')
+        city = shop_info.get('city', '')
+
+        region_info = region_mapping.get(shop_id, {})
+        region_city = region_info.get('city', city)
+        region_district = region_info.get('district', '')
+        region_business = region_info.get('business', '')
+
+        order_rank = row['order_user_rank']
+        verify_rank = row['verify_amount_rank']
+        order_rank_str = f"第{order_rank}名" if order_rank and order_rank < 100 else ("大于100名" if order_rank and order_rank >= 100 else "--")
+        verify_rank_str = f"第{verify_rank}名" if verify_rank and verify_rank < 100 else ("大于100名" if verify_rank and verify_rank >= 100 else "--")
+
+        summary_row = [
+            weekday, date_str, idx, operator, city, sales, shop_name,
+            counts['exposure_users'], counts['visit_users'],
+            counts['order_users'], counts['verify_users'],
+            counts['order_coupon_count'], counts['verify_coupon_count'],
+            counts['phone_clicks'], counts['address_clicks'],
+            amounts['promotion_cost'], counts['new_good_review_count'], row['intent_rate'] or '0%',
+            amounts['order_sale_amount'], amounts['verify_sale_amount'], amounts['verify_after_discount'],
+            order_rank_str, verify_rank_str
+        ]
+        ws_summary.append(styled_row(ws_summary, summary_row, alignment=CENTER_ALIGN, border=THIN_BORDER))
+
+        # 创建门店详细Sheet
+        sheet_name = clean_sheet_name(shop_name)
+        used = sheet_names_used[sheet_name] + 1
+        sheet_names_used[sheet_name] = used
+        if used > 1:
+            sheet_name = f"{sheet_name[:28]}_{used}"
+
+        ws_detail = wb.create_sheet(title=sheet_name)
+
+        order_users = counts['order_users']
+        verify_users = counts['verify_users']
+        new_review_count = counts['new_review_count']
+        new_collect_users = counts['new_collect_users']
+
+        review_rate = (new_review_count / verify_users * 100) if verify_users > 0 else 0
+        review_rate_str = f"{review_rate:.1f}%"
+        review_qualified = "达标" if review_rate >= 30 else "未达标"
+
+        collect_rate = (new_collect_users / order_users * 100) if order_users > 0 else 0
+        collect_rate_str = f"{collect_rate:.1f}%"
+        collect_qualified = "达标" if collect_rate >= 40 else "未达标"
+
+        coupon_7days = coupon_7days_mapping.get(shop_id, 0)
+        coupon_qualified = "达标" if coupon_7days >= 10 else "未达标"
+
+        ad_today = ad_today_mapping.get(shop_id, 0)
+        ad_qualified = "达标" if ad_today >= 1 else "未达标"
+
+        is_force_offline = counts['is_force_offline']
+        status_info = f"警告：有{is_force_offline}个团单被强制下线！" if is_force_offline > 0 else "今天邮件已查看，无违规无异常。"
+
+        region_display = f"{region_city} | {region_district} | {region_business}" if region_business else city
+        order_rank_display = f"{region_display}：第{order_rank}名" if order_rank and order_rank < 100 else f"{region_display}：大于100名"
+        verify_rank_display = f"{region_display}：第{verify_rank}名" if verify_rank and verify_rank < 100 else f"{region_display}：大于100名"
+
+        detail_data = [
+            [shop_name, status_info, ''],
+            [f"数据报表", f"日期({date_short})", ''],
+            ['【美团点评广告结果数据】', '', ''],
+            ['曝光人数：', counts['exposure_users'], ''],
+            ['访问人数：', counts['visit_users'], ''],
+            ['下单人数：', counts['order_users'], ''],
+            ['下单券数：', counts['order_coupon_count'], ''],
+            ['核销人数：', counts['verify_users'], ''],
+            ['核销券数：', counts['verify_coupon_count'], ''],
+            ['电话点击：', counts['phone_clicks'], ''],
+            ['地址点击：', counts['address_clicks'], ''],
+            ['在线咨询：', counts['consult_users'], ''],
+            ['', '', ''],
+            ['【店内干预数据】', '', ''],
+            ['新增收藏：', counts['new_collect_users'], ''],
+            ['新增打卡：', counts['checkin_count'], ''],
+            ['新增评价：', counts['new_review_count'], ''],
+            ['', '', ''],
+            ['【推广通数据】', '', ''],
+            ['推广通消耗：', amounts['promotion_cost'], ''],
+            ['推广通点击单价：', amounts['click_avg_price'], ''],
+            ['推广通下单量：', counts['promotion_order_count'], ''],
+            ['推广通余额：', amounts['ad_balance'], ''],
+            ['', '', ''],
+            [f'留评率（30%达标）：', review_rate_str, review_qualified],
+            [f'收藏率（40%达标）：', collect_rate_str, collect_qualified],
+            [f'近7天优惠码订单是否达标：', coupon_7days, coupon_qualified],
+            [f'广告单：', f"当天{ad_today}单", ad_qualified],
+            ['', '', ''],
+            ['下单售价金额：', amounts['order_sale_amount'], ''],
+            ['核销售价金额：', amounts['verify_sale_amount'], ''],
+            ['下单人数商圈排名：', order_rank_display, ''],
+            ['核销金额商圈排名：', verify_rank_display, ''],
+            ['', '', ''],
+            ['团单被强制下线数量：', is_force_offline, ''],
+            ['', '', ''],
+            ['运营：', operator, ''],
+            ['销售：', sales, ''],
+            ['城市：', city, ''],
+        ]
+
+        ws_detail.column_dimensions['A'].width = 40
+        ws_detail.column_dimensions['B'].width = 30
+        ws_detail.column_dimensions['C'].width = 15
+
+        section_rows = {3, 14, 19}
+        qualified_rows = {25, 26, 27, 28}
+        for row_num, row_data in enumerate(detail_data, start=1):
+            cells = styled_row(ws_detail, row_data, alignment=CENTER_ALIGN, border=THIN_BORDER)
+            if row_num == 1:
+                cells[0].font = TITLE_FONT
+                cells[1].font = STATUS_BAD_FONT if is_force_offline > 0 else STATUS_OK_FONT
+            elif row_num in section_rows:
+                cells[0].font = SECTION_FONT
+            elif row_num in qualified_rows and row_data[2] in QUALIFIED_FONTS:
+                cells[2].font = QUALIFIED_FONTS[row_data[2]]
+            ws_detail.append(cells)
+
+    return save_workbook(wb, f"日报_{report_date.strftime('%Y%m%d')}", in_memory)
+
+
+# ==================== 周报写入 ====================
+# 汇总表指标列：(指标, 类型)
+# amount: 金额，保留两位小数；count: 计数；price: 均价（计算时已保留两位小数）；rate: 百分比
+WEEKLY_SALES_COLUMNS = [
+    ('verify_after_discount', 'amount'), ('exposure_users', 'count'), ('visit_users', 'count'),
+    ('exposure_rate', 'rate'), ('order_users', 'count'), ('order_coupon_count', 'count'),
+    ('order_rate', 'rate'), ('verify_users', 'count'), ('verify_coupon_count', 'count'),
+    ('order_sale_amount', 'amount'), ('verify_sale_amount', 'amount'), ('coupon_orders', 'count'),
+    ('phone_clicks', 'count'), ('avg_price', 'price'),
+]
+WEEKLY_PROMOTION_COLUMNS = [
+    ('promotion_cost', 'amount'), ('promotion_exposure', 'count'), ('promotion_clicks', 'count'),
+    ('click_price', 'price'), ('promotion_orders', 'count'), ('promo_rate', 'rate'),
+    ('view_groupbuy', 'count'), ('view_phone', 'count'), ('consult_users', 'count'),
+    ('address_clicks', 'count'), ('new_collect', 'count'), ('collect_rate', 'rate'),
+    ('new_good_reviews', 'count'), ('review_rate', 'rate'),
+]
+
+# 直接取自查询结果的指标（其余为计算得到的比率、均价）
+WEEKLY_SUM_FIELDS = [
+    key for key, kind in WEEKLY_SALES_COLUMNS + WEEKLY_PROMOTION_COLUMNS if kind in ('amount', 'count')
+]
+
+WEEKLY_SALES_HEADER = ['序号', '运营', '城市', '销售', '门店', '数据周期', '优惠后核销额', '曝光人数', '访问人数', '曝光访问转化率', '下单人数', '下单券数', '下单转化率', '核销人数', '核销券数', '下单售价金额', '核销售价金额', '优惠码订单', '电话点击', '客单价']
+WEEKLY_PROMOTION_HEADER = ['数据周期', '推广通花费', '推广通曝光', '推广通点击', '推广通点击均价', '推广通订单量', '推广通下单转化率', '推广通查看团购', '推广通查看电话', '在线咨询', '地址点击', '门店收藏', '收藏率', '新增好评数', '留评率']
+
+
+def weekly_period_metrics(w: dict) -> dict:
+    """计算单个周期的全部汇总表指标，每个门店每个周期只算一次"""
+    m = {key: safe_get_val(w, key) for key in WEEKLY_SUM_FIELDS}
+    m['exposure_rate'] = calc_rate(m['visit_users'], m['exposure_users'])
+    m['order_rate'] = calc_rate(m['order_users'], m['visit_users'])
+    m['avg_price'] = calc_avg_price(m['verify_after_discount'], m['verify_users'])
+    m['click_price'] = calc_avg_price(m['promotion_cost'], m['promotion_clicks'])
+    m['promo_rate'] = calc_rate(m['promotion_orders'], m['promotion_clicks'])
+    m['collect_rate'] = calc_rate(m['new_collect'], m['visit_users'])
+    m['review_rate'] = calc_rate(m['new_good_reviews'], m['verify_users'])
+    return m
+
+
+def weekly_period_values(m: dict, columns: list) -> list:
+    """按列定义输出一个周期的单元格值"""
+    values = []
+    for key, kind in columns:
+        value = m[key]
+        if kind == 'amount':
+            value = round(value, 2)
+        elif kind == 'rate':
+            value = f"{value}%"
+        values.append(value)
+    return values
+
+
+def weekly_diff_values(m1: dict, m2: dict, columns: list) -> list:
+    """按列定义输出两个周期的差值（周2 - 周1）"""
+    values = []
+    for key, kind in columns:
+        if kind == 'rate':
+            values.append(f"{round(m2[key] - m1[key], 1)}%")
+        elif kind == 'count':
+            values.append(m2[key] - m1[key])
+        else:
+            values.append(round(m2[key] - m1[key], 2))
+    return values
+
+
+def write_weekly_xlsx(data: dict, in_memory: bool = False) -> Union[str, Tuple[str, bytes]]:
+    """
+    将周报（两周期对比）数据写入 Excel，返回值见 save_workbook
+    data 由 fetch_weekly_data 查询得到，月报、自定义报表共用
+    周报只有一张大表，序列化是主要耗时，使用 xlsxwriter 写入（比 openpyxl 快数倍）
+    """
+    week1_start = data['week1_start']
+    week1_end = data['week1_end']
+    week2_start = data['week2_start']
+    week2_end = data['week2_end']
+    week1_data = data['week1_data']
+    week2_data = data['week2_data']
+    shop_mapping = data['shop_mapping']
+
+    all_shop_ids = set(week1_data.keys()) | set(week2_data.keys())
+
+    # 创建 Excel 工作簿（写入内存，保存时再落盘或直接返回）
+    buffer = io.BytesIO()
+    wb = xlsxwriter.Workbook(buffer, XLSXWRITER_OPTIONS)
+    ws_summary = wb.add_worksheet("汇总")
+    formats = {name: wb.add_format(props) for name, props in WEEKLY_FORMATS.items()}
+
+    summary_widths = [8, 18, 10, 10, 78, 26] + [15] * 14
+    for col_idx, width in enumerate(summary_widths):
+        ws_summary.set_column(col_idx, col_idx, width)
+
+    week1_str = f"{week1_start.strftime('%Y.%m.%d')}-{week1_end.strftime('%Y.%m.%d')}"
+    week2_str = f"{week2_start.strftime('%Y.%m.%d')}-{week2_end.strftime('%Y.%m.%d')}"
+
+    cell_format = formats['cell']
+    header_format = formats['header']
+    diff_format = formats['diff']
+
+    row = 0
+    seq_num = 1
+
+    for shop_id in sorted(all_shop_ids):
+        w1 = week1_data.get(shop_id, {})
+        w2 = week2_data.get(shop_id, {})
+        shop_name = w2.get('shop_name') or w1.get('shop_name', '未知门店')
+
+        shop_id_str = str(shop_id)
+        shop_info = shop_mapping.get(shop_id_str, {})
+        operator = shop_info.get('operator', '--') or '--'
+        sales = shop_info.get('sales', '--') or '--'
+        city = shop_info.get('city', '--') or '--'
+
+        m1 = weekly_period_metrics(w1)
+        m2 = weekly_period_metrics(w2)
+
+        # 汇总表8行结构：经营数据（表头、周1、周2、差值）+ 推广通数据（表头、周1、周2、差值）
+        ws_summary.write_row(row, 0, WEEKLY_SALES_HEADER, header_format)
+
+        # 第2~8行的前5列（序号、运营、城市、销售、门店）纵向合并
+        # 被合并的单元格改写为只有左右边框（区块最后一行加下边框），与 openpyxl merge_cells 合并后的样式一致
+        for col, value in enumerate([seq_num, operator, city, sales, shop_name]):
+            ws_summary.merge_range(row + 1, col, row + 7, col, value, cell_format)
+            for merged_row in range(row + 2, row + 7):
+                ws_summary.write_blank(merged_row, col, None, formats['merged'])
+            ws_summary.write_blank(row + 7, col, None, formats['merged_last'])
+
+        ws_summary.write_row(row + 1, 5, [week1_str] + weekly_period_values(m1, WEEKLY_SALES_COLUMNS), cell_format)
+        ws_summary.write_row(row + 2, 5, [week2_str] + weekly_period_values(m2, WEEKLY_SALES_COLUMNS), cell_format)
+        ws_summary.write_row(row + 3, 5, ['差值'] + weekly_diff_values(m1, m2, WEEKLY_SALES_COLUMNS), diff_format)
+
+        ws_summary.write_row(row + 4, 5, WEEKLY_PROMOTION_HEADER, header_format)
+        ws_summary.write_row(row + 5, 5, [week1_str] + weekly_period_values(m1, WEEKLY_PROMOTION_COLUMNS), cell_format)
+        ws_summary.write_row(row + 6, 5, [week2_str] + weekly_period_values(m2, WEEKLY_PROMOTION_COLUMNS), cell_format)
+        ws_summary.write_row(row + 7, 5, ['差值'] + weekly_diff_values(m1, m2, WEEKLY_PROMOTION_COLUMNS), diff_format)
+
+        row += 8
+        seq_num += 1
+
+    wb.close()
+    return save_workbook_bytes(buffer, f"周报_{week2_start.strftime('%Y%m%d')}_{week2_end.strftime('%Y%m%d')}", in_memory)
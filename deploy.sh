@@ -30,9 +30,6 @@ if ! docker compose version &> /dev/null; then
     exit 1
 fi
 
-# 创建报表输出目录
-mkdir -p reports
-
 # 构建并启动服务
 echo "正在构建并启动服务..."
 docker compose up -d --build
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+服务启动脚本
+使用 uvloop 事件循环 + httptools HTTP 解析器，多进程运行
+"""
+
+import uvicorn
+
+from app.core.config import settings
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=settings.WEB_WORKERS,
+        loop="uvloop",
+        http="httptools",
+        limit_concurrency=settings.LIMIT_CONCURRENCY,
+        timeout_keep_alive=settings.KEEPALIVE_TIMEOUT
+    )